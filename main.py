@@ -1,22 +1,78 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, BackgroundTasks, Response
 import httpx
 import os
-import pytz
+from zoneinfo import ZoneInfo
 import re
 import logging
-import json
+import orjson
 from datetime import datetime
+from typing import NamedTuple
 import openai
 import asyncio
+import functools
+import io
+import weakref
+import uuid
+import contextvars
+from contextlib import asynccontextmanager
+from cachetools import TTLCache
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential, retry_if_exception
+
+# Id de correlação do webhook em andamento, incluído em todas as linhas de log
+correlation_id = contextvars.ContextVar("correlation_id", default="-")
+
+class CorrelationIdFilter(logging.Filter):
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+log_handler = logging.StreamHandler()
+log_handler.addFilter(CorrelationIdFilter())
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(levelname)s:%(name)s:[%(correlation_id)s] %(message)s",
+    handlers=[log_handler]
+)
 logger = logging.getLogger(__name__)
 
+def build_http_client(headers):
+    # Cliente com keep-alive/HTTP2 e headers fixos aplicados a todas as requisições
+    # (as novas tentativas ficam só em request_with_retry, não no transporte)
+    return httpx.AsyncClient(
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+        ),
+        timeout=httpx.Timeout(connect=2.0, read=10.0, write=5.0, pool=2.0),
+        headers=headers
+    )
+
+@asynccontextmanager
+async def lifespan(app):
+    # Falha logo na subida em vez de mandar "Bearer None" ao Notion a cada webhook
+    missing = [name for name in REQUIRED_ENV_VARS if not os.getenv(name)]
+    if missing:
+        error_msg = f"Missing required environment variables: {', '.join(missing)}"
+        logger.error(error_msg)
+        raise RuntimeError(error_msg)
+    if not ADMIN_PHONES:
+        logger.warning("ADMIN_PHONES não definido; nenhuma mensagem WhatsApp será enviada")
+    
+    # Um cliente compartilhado por API, reaproveitando conexões entre webhooks
+    app.state.notion = build_http_client(NOTION_HEADERS)
+    app.state.zapi = build_http_client(ZAPI_HEADERS)
+    try:
+        yield
+    finally:
+        await app.state.notion.aclose()
+        await app.state.zapi.aclose()
+
 app = FastAPI(
     title="Read.ai Webhook Integration",
     description="Webhook integration between Read.ai, Notion, and WhatsApp",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 @app.get("/")
@@ -37,26 +93,105 @@ NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
 ZAPI_INSTANCE = os.getenv("ZAPI_INSTANCE")
 ZAPI_TOKEN = os.getenv("ZAPI_TOKEN")
 ZAPI_CLIENT_TOKEN = os.getenv("ZAPI_CLIENT_TOKEN")
-ADMIN_PHONES = [p.strip() for p in os.getenv("ADMIN_PHONES", "").split(",") if p]
-TZ = pytz.timezone(os.getenv("TZ", "America/Sao_Paulo"))
+ADMIN_PHONES = tuple(p.strip() for p in os.getenv("ADMIN_PHONES", "").split(",") if p.strip())
+TZ = ZoneInfo(os.getenv("TZ", "America/Sao_Paulo"))
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+REQUIRED_ENV_VARS = ("NOTION_TOKEN", "NOTION_DATABASE_ID", "ZAPI_INSTANCE", "ZAPI_TOKEN", "ZAPI_CLIENT_TOKEN")
 
 if OPENAI_API_KEY:
     openai.api_key = OPENAI_API_KEY
 
-# Função para buscar a página no Notion pelo email
-def notion_headers():
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json; charset=utf-8",
-        "Accept-Charset": "utf-8"
+# Partes fixas das páginas criadas/atualizadas no Notion (só leitura, reaproveitadas a cada webhook)
+PAGE_ICON = {"external": {"url": "https://i.imgur.com/pFbQrWe.png"}}
+PAGE_COVER = {"external": {"url": "https://i.imgur.com/AWoGTe4.png"}}
+TRANSCRIPT_HEADING_BLOCK = {
+    "object": "block",
+    "type": "heading_1",
+    "heading_1": {
+        "rich_text": [{"type": "text", "text": {"content": "🗣️ Transcript"}}]
     }
-    logger.info(f"Using Notion headers: {json.dumps(headers, default=str)}")
-    return headers
+}
+
+# Cache email -> (page_id, parent_page_id); a linha do lead no Notion raramente muda
+PAGE_CACHE = TTLCache(maxsize=1024, ttl=3600)
+# Locks por email, descartados automaticamente quando ninguém mais os usa
+PAGE_LOCKS = weakref.WeakValueDictionary()
+
+# Respostas que indicam que a requisição não foi processada e pode ser repetida
+RETRYABLE_STATUS_CODES = {429, 503}
+# Erros de gateway: o servidor pode já ter processado a requisição, então só
+# são repetidos em chamadas idempotentes
+IDEMPOTENT_RETRYABLE_STATUS_CODES = RETRYABLE_STATUS_CODES | {502, 504}
+
+# O Notion aceita no máximo 100 itens por rich_text; textos maiores viram vários parágrafos
+NOTION_MAX_RICH_TEXT_ITEMS = 100
+# Transcrições maiores são cortadas para a criação da página não estourar o corpo aceito pelo Notion
+NOTION_TRANSCRIPT_MAX_CHARS = 200_000
+# Trecho da transcrição enviado ao LLM, para o prompt caber na janela de contexto
+OPENAI_TRANSCRIPT_MAX_CHARS = 60_000
+TRUNCATED_MARKER = "\n[... transcrição cortada]"
+
+# Links markdown no formato [texto](url)
+MARKDOWN_LINK_RE = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
+
+# Headers fixos, montados uma única vez
+NOTION_HEADERS = {
+    "Authorization": f"Bearer {NOTION_TOKEN}",
+    "Notion-Version": "2022-06-28",
+    "Content-Type": "application/json; charset=utf-8",
+    "Accept-Charset": "utf-8"
+}
+ZAPI_HEADERS = {
+    "Content-Type": "application/json",
+    "Client-Token": ZAPI_CLIENT_TOKEN
+}
 
+def is_retryable(exc, idempotent=False):
+    if isinstance(exc, httpx.HTTPStatusError):
+        status_codes = IDEMPOTENT_RETRYABLE_STATUS_CODES if idempotent else RETRYABLE_STATUS_CODES
+        return exc.response.status_code in status_codes
+    # Só erros em que a requisição nunca chegou ao servidor, para não duplicar páginas/mensagens
+    return isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+async def request_with_retry(client, method, url, idempotent=False, **kwargs):
+    """
+    Faz a requisição pelo cliente compartilhado, com backoff exponencial em falhas temporárias.
+    Use idempotent=True apenas quando repetir a chamada não cria nada duplicado.
+    """
+    async for attempt in AsyncRetrying(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=0.2, max=2.0),
+        retry=retry_if_exception(functools.partial(is_retryable, idempotent=idempotent)),
+        reraise=True
+    ):
+        with attempt:
+            response = await client.request(method, url, **kwargs)
+            response.raise_for_status()
+    return response
+
+# Função para buscar a página no Notion pelo email
 async def find_page_by_email(email):
+    cached = PAGE_CACHE.get(email)
+    if cached:
+        logger.info(f"Using cached Notion page for email: {email}")
+        return cached
+    
+    # Webhooks simultâneos do mesmo email esperam uma única consulta ao Notion
+    lock = PAGE_LOCKS.get(email)
+    if lock is None:
+        lock = PAGE_LOCKS[email] = asyncio.Lock()
+    async with lock:
+        cached = PAGE_CACHE.get(email)
+        if cached:
+            logger.info(f"Using cached Notion page for email: {email}")
+            return cached
+        page_id, parent_page_id = await search_page_by_email(email)
+        if page_id and parent_page_id:
+            PAGE_CACHE[email] = (page_id, parent_page_id)
+        return page_id, parent_page_id
+
+async def search_page_by_email(email):
     search_url = f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}/query"
     logger.info(f"Searching Notion for email: {email}")
     logger.info(f"Using database ID: {NOTION_DATABASE_ID}")
@@ -67,105 +202,99 @@ async def find_page_by_email(email):
             "email": {"equals": email}
         }
     }
-    logger.info(f"Search body: {json.dumps(search_body, default=str)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Search body: %s", orjson.dumps(search_body, default=str).decode())
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(search_url, json=search_body, headers=notion_headers())
-            response.raise_for_status()
-            data = response.json()
-            logger.info(f"Notion search response: {json.dumps(data, default=str)}")
-            
-            if not data.get("results"):
-                logger.warning(f"No results found for email: {email}")
-                return None, None
-            
-            # Get both the page ID and the Page ID property
-            page = data["results"][0]
-            page_id = page["id"]
-            parent_page_id = page["properties"].get("Page ID", {}).get("formula", {}).get("string")
+        response = await request_with_retry(app.state.notion, "POST", search_url, idempotent=True, content=orjson.dumps(search_body))
+        data = orjson.loads(response.content)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Notion search response: %s", orjson.dumps(data, default=str).decode())
+        
+        if not data.get("results"):
+            logger.warning(f"No results found for email: {email}")
+            return None, None
+        
+        # Get both the page ID and the Page ID property
+        page = data["results"][0]
+        page_id = page["id"]
+        parent_page_id = page["properties"].get("Page ID", {}).get("formula", {}).get("string")
+        
+        if not parent_page_id:
+            logger.error("Page ID property not found or empty")
+            return None, None
             
-            if not parent_page_id:
-                logger.error("Page ID property not found or empty")
-                return None, None
-                
-            logger.info(f"Found Notion page ID: {page_id} with Parent Page ID: {parent_page_id}")
-            return page_id, parent_page_id
+        logger.info(f"Found Notion page ID: {page_id} with Parent Page ID: {parent_page_id}")
+        return page_id, parent_page_id
     except Exception as e:
         logger.error(f"Error searching Notion: {str(e)}")
         raise
 
-# Função para atualizar status e transcrição
-def build_transcript(transcript_data):
-    if not transcript_data or "speaker_blocks" not in transcript_data:
-        return "Transcrição não disponível"
-        
-    # Construir a transcrição formatada
-    formatted_transcript = []
-    for block in transcript_data["speaker_blocks"]:
-        speaker = block.get("speaker", {}).get("name", "Desconhecido")
-        words = block.get("words", "")
-        start_time = block.get("start_time", "")
-        
-        if start_time:
-            try:
-                # Converter timestamp para datetime
-                timestamp_ms = int(start_time)
-                dt = datetime.fromtimestamp(timestamp_ms / 1000)
-                local_time = dt.astimezone(TZ)
-                timestamp_str = local_time.strftime("%H:%M:%S")
-            except:
-                timestamp_str = ""
-        else:
-            timestamp_str = ""
-            
-        formatted_line = f"[{timestamp_str}] {speaker}: {words}"
-        formatted_transcript.append(formatted_line)
-    
-    return "\n".join(formatted_transcript)
+def truncate_text(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] + TRUNCATED_MARKER
+
+def paragraph_blocks(rich_text):
+    """
+    Distribui os blocos rich_text em parágrafos de até NOTION_MAX_RICH_TEXT_ITEMS itens.
+    Texto vazio ainda gera um parágrafo vazio.
+    """
+    return [
+        {
+            "object": "block",
+            "type": "paragraph",
+            "paragraph": {
+                "rich_text": rich_text[i:i + NOTION_MAX_RICH_TEXT_ITEMS]
+            }
+        }
+        for i in range(0, max(len(rich_text), 1), NOTION_MAX_RICH_TEXT_ITEMS)
+    ]
+
+def plain_text_to_notion_rich_text(text, chunk_size=2000):
+    """
+    Converte texto sem links para blocos rich_text do Notion.
+    Divide em blocos de até chunk_size caracteres.
+    """
+    return [{"text": {"content": text[i:i + chunk_size]}} for i in range(0, len(text), chunk_size)]
 
 def markdown_to_notion_rich_text(text, chunk_size=2000):
     """
     Converte markdown simples com links [texto](url) para blocos rich_text do Notion.
     Divide em blocos de até chunk_size caracteres.
     """
-    pattern = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
-    parts = []
+    return list(cached_markdown_to_notion_rich_text(text, chunk_size))
+
+# Reentregas do mesmo webhook reaproveitam a conversão. Os blocos em cache são
+# compartilhados entre chamadas e não devem ser alterados.
+@functools.lru_cache(maxsize=256)
+def cached_markdown_to_notion_rich_text(text, chunk_size):
+    # Sem links: basta fatiar o texto, sem regex nem montagem incremental
+    if "](" not in text:
+        return tuple(plain_text_to_notion_rich_text(text, chunk_size))
+    # 1ª passada: trechos (início, fim, link) na ordem em que aparecem no texto
+    spans = []
     last_end = 0
-    for match in pattern.finditer(text):
+    for match in MARKDOWN_LINK_RE.finditer(text):
         # Texto antes do link
         if match.start() > last_end:
-            parts.append({"text": {"content": text[last_end:match.start()]}})
-        # O link
-        link_text = match.group(1)
-        link_url = match.group(2)
-        parts.append({"text": {"content": link_text, "link": {"url": link_url}}})
+            spans.append((last_end, match.start(), None))
+        # O link (só o texto entre colchetes é exibido)
+        spans.append((match.start(1), match.end(1), {"url": match.group(2)}))
         last_end = match.end()
     # Qualquer texto depois do último link
     if last_end < len(text):
-        parts.append({"text": {"content": text[last_end:]}})
-    # Agora, dividir em blocos de até chunk_size caracteres
+        spans.append((last_end, len(text), None))
+    # 2ª passada: fatiar cada trecho em blocos de até chunk_size caracteres
     blocks = []
-    current_block = {"text": {"content": ""}}
-    for part in parts:
-        content = part["text"]["content"]
-        link = part["text"].get("link")
-        while content:
-            space_left = chunk_size - len(current_block["text"]["content"])
-            if space_left <= 0:
-                if current_block["text"]["content"]:
-                    blocks.append(current_block)
-                current_block = {"text": {"content": ""}}
-                continue
-            take = content[:space_left]
+    for start, end, link in spans:
+        for i in range(start, end, chunk_size):
+            content = text[i:min(i + chunk_size, end)]
             if link:
-                blocks.append({"text": {"content": take, "link": link}})
+                blocks.append({"text": {"content": content, "link": link}})
             else:
-                current_block["text"]["content"] += take
-            content = content[space_left:]
-    if current_block["text"]["content"]:
-        blocks.append(current_block)
-    return blocks
+                blocks.append({"text": {"content": content}})
+    return tuple(blocks)
 
 async def create_meeting_page(parent_page_id, meeting_data, transcript, full_markdown):
     create_url = "https://api.notion.com/v1/pages"
@@ -174,24 +303,19 @@ async def create_meeting_page(parent_page_id, meeting_data, transcript, full_mar
     # Usar o título original da reunião
     title = meeting_data.get("title", "Sem título")
     
-    # Converter o markdown em blocos rich_text
-    markdown_blocks = markdown_to_notion_rich_text(full_markdown)
-    transcript_blocks = markdown_to_notion_rich_text(transcript)
+    # Converter o markdown em blocos rich_text fora do event loop
+    markdown_blocks, transcript_blocks = await asyncio.gather(
+        asyncio.to_thread(markdown_to_notion_rich_text, full_markdown),
+        # A transcrição nunca contém links markdown
+        asyncio.to_thread(plain_text_to_notion_rich_text, truncate_text(transcript, NOTION_TRANSCRIPT_MAX_CHARS))
+    )
     
     create_data = {
         "parent": {
             "page_id": parent_page_id
         },
-        "icon": {
-            "external": {
-                "url": "https://i.imgur.com/pFbQrWe.png"
-            }
-        },
-        "cover": {
-            "external": {
-                "url": "https://i.imgur.com/AWoGTe4.png"
-            }
-        },
+        "icon": PAGE_ICON,
+        "cover": PAGE_COVER,
         "properties": {
             "title": {
                 "title": [
@@ -204,63 +328,43 @@ async def create_meeting_page(parent_page_id, meeting_data, transcript, full_mar
             }
         },
         "children": [
-            {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": markdown_blocks
-                }
-            },
-            {
-                "object": "block",
-                "type": "heading_1",
-                "heading_1": {
-                    "rich_text": [{"type": "text", "text": {"content": "🗣️ Transcript"}}]
-                }
-            },
-            {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": transcript_blocks
-                }
-            }
+            *paragraph_blocks(markdown_blocks),
+            TRANSCRIPT_HEADING_BLOCK,
+            *paragraph_blocks(transcript_blocks)
         ]
     }
     
-    logger.info(f"Create data: {json.dumps(create_data, default=str)}")
+    # Serializa uma única vez; o log mostra só o tamanho, já que o corpo carrega a transcrição inteira
+    body = orjson.dumps(create_data)
+    logger.debug("Create data: %d bytes", len(body))
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(create_url, json=create_data, headers=notion_headers())
-            response.raise_for_status()
-            result = response.json()
-            logger.info(f"Created meeting page with ID: {result.get('id')}")
-            return result.get('id')
+        response = await request_with_retry(app.state.notion, "POST", create_url, content=body)
+        page_id = orjson.loads(response.content).get("id")
+        logger.info(f"Created meeting page with ID: {page_id}")
+        return page_id
     except Exception as e:
         logger.error(f"Error creating meeting page: {str(e)}")
         raise
 
-async def update_lead_status(page_id, status="Reunião Realizada"):
-    update_url = f"https://api.notion.com/v1/pages/{page_id}"
-    logger.info(f"Updating lead status for page: {page_id}")
-    
+# O corpo do PATCH só depende do status, então é serializado uma vez por status
+@functools.lru_cache(maxsize=None)
+def lead_status_payload(status):
     update_data = {
-        "icon": {
-            "external": {
-                "url": "https://i.imgur.com/pFbQrWe.png"
-            }
-        },
+        "icon": PAGE_ICON,
         "properties": {
             "Status": {"status": {"name": status}}
         }
     }
+    return orjson.dumps(update_data)
+
+async def update_lead_status(page_id, status="Reunião Realizada"):
+    update_url = f"https://api.notion.com/v1/pages/{page_id}"
+    logger.info(f"Updating lead status for page: {page_id}")
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.patch(update_url, json=update_data, headers=notion_headers())
-            response.raise_for_status()
-            logger.info("Successfully updated lead status and icon")
+        await request_with_retry(app.state.notion, "PATCH", update_url, idempotent=True, content=lead_status_payload(status))
+        logger.info("Successfully updated lead status and icon")
     except Exception as e:
         logger.error(f"Error updating lead status: {str(e)}")
         raise
@@ -268,96 +372,174 @@ async def update_lead_status(page_id, status="Reunião Realizada"):
 # Função para enviar mensagem WhatsApp via Z-API para múltiplos números
 async def send_whatsapp_message_to_admins(message):
     url = f"https://api.z-api.io/instances/{ZAPI_INSTANCE}/token/{ZAPI_TOKEN}/send-text"
-    headers = {
-        "Content-Type": "application/json",
-        "Client-Token": ZAPI_CLIENT_TOKEN
-    }
-    async with httpx.AsyncClient() as client:
-        for phone in ADMIN_PHONES:
-            payload = {
-                "phone": phone,
-                "message": message
-            }
-            response = await client.post(url, json=payload, headers=headers)
-            response.raise_for_status()
+    tasks = [
+        request_with_retry(app.state.zapi, "POST", url, content=orjson.dumps({"phone": phone, "message": message}))
+        for phone in ADMIN_PHONES
+    ]
+    responses = await asyncio.gather(*tasks, return_exceptions=True)
 
-@app.post("/webhook")
-async def webhook(request: Request):
+    # Um admin fora do ar não derruba o webhook: só falha se nenhum envio der certo
+    errors = []
+    for phone, response in zip(ADMIN_PHONES, responses):
+        if isinstance(response, Exception):
+            logger.error(f"Failed to send WhatsApp message to {phone}: {str(response)}")
+            errors.append(response)
+    if errors and len(errors) == len(ADMIN_PHONES):
+        raise errors[0]
+
+async def process_meeting(data, email, request_id):
+    # Mantém o mesmo id de correlação da requisição que enfileirou o processamento
+    correlation_id.set(request_id)
     try:
-        data = await request.json()
-        logger.info(f"Received webhook data: {json.dumps(data, default=str)}")
+        # 2. Extrai uma única vez os campos usados pelo resumo e pelo WhatsApp
+        ctx = prepare_meeting_context(data, email)
         
-        # 1. Pega o email do owner da reunião
-        email = data["owner"]["email"]
-        logger.info(f"Processing meeting for email: {email}")
-        
-        # 2. Busca a página no Notion e o Page ID
-        page_id, parent_page_id = await find_page_by_email(email)
-        if not page_id or not parent_page_id:
-            error_msg = f"Linha não encontrada para o e-mail: {email}"
-            logger.error(error_msg)
-            raise HTTPException(status_code=404, detail=error_msg)
-            
-        # 3. Monta a transcrição
-        transcript = build_transcript(data)
+        # 3. Busca a página no Notion enquanto monta a transcrição e o resumo completo
+        (page_id, parent_page_id), (transcript, full_markdown) = await asyncio.gather(
+            find_page_by_email(email),
+            asyncio.to_thread(build_meeting_texts, data, ctx)
+        )
         logger.info(f"Built transcript, length: {len(transcript)}")
-        
-        # 4. Monta o resumo completo
-        full_markdown = build_full_meeting_markdown(data)
         logger.info(f"Built full markdown, length: {len(full_markdown)}")
+        if not page_id or not parent_page_id:
+            logger.error(f"Linha não encontrada para o e-mail: {email}")
+            return
         
-        # 4.1 Analisa objeções via LLM
-        observation_msg = await analyze_objections(data.get("summary", ""), transcript)
-        logger.info(f"Observation message from LLM: {observation_msg}")
+        # 4. Analisa objeções via LLM
+        observation_msg = await analyze_objections(ctx.summary, transcript)
+        logger.info("Observation message from LLM: %s", observation_msg)
         
-        # 5. Cria uma nova página para a reunião
-        try:
-            await create_meeting_page(parent_page_id, data, transcript, full_markdown)
-            logger.info("Successfully created meeting page")
-        except Exception as e:
-            logger.error(f"Failed to create meeting page: {str(e)}")
-            raise
-            
-        # 6. Atualiza o status do lead
-        try:
-            await update_lead_status(page_id)
-            logger.info("Successfully updated lead status")
-        except Exception as e:
-            logger.error(f"Failed to update lead status: {str(e)}")
-            raise
-            
-        # 7. Monta mensagem WhatsApp
-        owner = data["owner"]["name"]
-        lead = next((p["name"] for p in data.get("participants", []) if p["email"] != email), "Lead")
-        assunto = ", ".join([t["text"] for t in data.get("topics", [])])
-        proximas_etapas = "\n• " + "\n• ".join([a["text"] for a in data.get("action_items", [])])
+        # 5. Monta mensagem WhatsApp
+        whatsapp_msg = build_whatsapp_message(ctx, observation_msg)
+        logger.info("Prepared WhatsApp message: %s", whatsapp_msg)
         
-        whatsapp_msg = (
-            f"🤝 *Nova Reunião Realizada*\n\n"
-            f"👤 *Responsável:* {owner}\n"
-            f"🎯 *Lead:* {lead}\n\n"
-            f"📝 *Assuntos Abordados:*\n{assunto}\n\n"
-            f"✅ *Próximas Etapas:*{proximas_etapas}\n\n"
-            f"💫 *Observação:* {observation_msg}"
+        # 6. Cria a página da reunião, atualiza o status do lead e envia WhatsApp em paralelo
+        results = await asyncio.gather(
+            create_meeting_page(parent_page_id, data, transcript, full_markdown),
+            update_lead_status(page_id),
+            send_whatsapp_message_to_admins(whatsapp_msg),
+            return_exceptions=True
         )
-        logger.info(f"Prepared WhatsApp message: {whatsapp_msg}")
+        # Cada etapa já registra a própria falha no log
+        notion_results = results[:2]
+        # Página removida ou movida no Notion: descarta o cache para a próxima busca
+        if any(isinstance(r, httpx.HTTPStatusError) and r.response.status_code == 404 for r in notion_results):
+            PAGE_CACHE.pop(email, None)
+        if any(isinstance(r, BaseException) for r in results):
+            return
+        logger.info("Successfully created meeting page, updated lead status and sent WhatsApp messages")
+    except Exception as e:
+        # Roda em background: o erro só pode ir para o log
+        logger.error(f"Meeting processing error: {str(e)}")
+
+@app.post("/webhook")
+async def webhook(request: Request, background_tasks: BackgroundTasks):
+    request_id = uuid.uuid4().hex[:12]
+    correlation_id.set(request_id)
+    try:
+        body = await request.body()
+        logger.info("Received webhook data: %d bytes", len(body))
+        if logger.isEnabledFor(logging.DEBUG):
+            # Loga o corpo recebido como veio, sem serializar o payload de novo
+            logger.debug("Received webhook data: %s", body.decode(errors="replace"))
+        data = orjson.loads(body)
         
-        # 8. Envia WhatsApp para todos os admins
-        try:
-            await send_whatsapp_message_to_admins(whatsapp_msg)
-            logger.info("Successfully sent WhatsApp messages")
-        except Exception as e:
-            logger.error(f"Failed to send WhatsApp messages: {str(e)}")
-            raise
-            
-        return {"ok": True}
+        # 1. Pega o email do owner da reunião
+        email = data["owner"]["email"]
+        logger.info(f"Processing meeting for email: {email}")
     except Exception as e:
         logger.error(f"Webhook error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
-def build_full_meeting_markdown(data):
-    sections = []
+    # Responde imediatamente; Notion e WhatsApp são processados depois da resposta
+    background_tasks.add_task(process_meeting, data, email, request_id)
+    return Response(
+        content=orjson.dumps({"ok": True, "queued": True, "request_id": request_id}),
+        status_code=202,
+        media_type="application/json"
+    )
+
+class MeetingContext(NamedTuple):
+    owner_name: str
+    lead_name: str
+    participants_csv: str
+    topics_csv: str
+    action_items: tuple
+    summary: str
+
+def prepare_meeting_context(data, email):
+    # Cada campo do payload é lido uma única vez; listas nulas viram vazias
+    owner = data["owner"]
+    participants = data.get("participants") or []
+    topics = data.get("topics") or []
+    action_items = data.get("action_items") or []
+    
+    # Uma só passada pelos participantes: nomes para o resumo e o primeiro lead
+    names = []
+    lead_name = None
+    for p in participants:
+        names.append(p.get("name", ""))
+        if lead_name is None and p["email"] != email:
+            lead_name = p["name"]
+    return MeetingContext(
+        owner_name=owner["name"],
+        lead_name=lead_name if lead_name is not None else "Lead",
+        participants_csv=", ".join(names),
+        topics_csv=", ".join(t["text"] for t in topics),
+        action_items=tuple(a.get("text", "") for a in action_items),
+        summary=data.get("summary", "")
+    )
+
+def build_whatsapp_message(ctx, observation_msg):
+    proximas_etapas = "\n• " + "\n• ".join(ctx.action_items)
+    return (
+        f"🤝 *Nova Reunião Realizada*\n\n"
+        f"👤 *Responsável:* {ctx.owner_name}\n"
+        f"🎯 *Lead:* {ctx.lead_name}\n\n"
+        f"📝 *Assuntos Abordados:*\n{ctx.topics_csv}\n\n"
+        f"✅ *Próximas Etapas:*{proximas_etapas}\n\n"
+        f"💫 *Observação:* {observation_msg}"
+    )
+
+def build_meeting_texts(data, ctx):
+    """
+    Monta numa única função a transcrição formatada e o resumo completo em markdown.
+    Retorna (transcricao, markdown).
+    """
+    transcript_buf = io.StringIO()
+    markdown_buf = io.StringIO()
+    ts = transcript_buf.write
+    md = markdown_buf.write
+    
+    # Transcrição (blocos já chegam em ordem cronológica)
+    transcript_data = data.get("transcript")
+    if not transcript_data or "speaker_blocks" not in transcript_data:
+        ts("Transcrição não disponível")
+    else:
+        # Referências locais evitam buscas de atributo/global a cada bloco
+        fromtimestamp = datetime.fromtimestamp
+        tz = TZ
+        sep = ""
+        for block in transcript_data["speaker_blocks"]:
+            # Sem dict vazio de fallback a cada bloco
+            sp = block.get("speaker")
+            speaker = sp.get("name", "Desconhecido") if sp else "Desconhecido"
+            words = block.get("words", "")
+            start_time = block.get("start_time", "")
+            
+            if start_time:
+                try:
+                    # Converter timestamp para datetime
+                    timestamp_str = fromtimestamp(int(start_time) / 1000, tz).strftime("%H:%M:%S")
+                except:
+                    timestamp_str = ""
+            else:
+                timestamp_str = ""
+                
+            ts(f"{sep}[{timestamp_str}] {speaker}: {words}")
+            sep = "\n"
     
+    # Resumo completo: cada seção depois da primeira começa com "\n"
     # Título e Informações Básicas
     title = data.get("title", "Sem título")
     start_time = data.get("start_time", "")
@@ -365,68 +547,65 @@ def build_full_meeting_markdown(data):
     report_url = data.get("report_url", "")
     
     # Cabeçalho
-    sections.append(f"# {title}\n")
+    md(f"# {title}\n")
     
     # Link para o relatório
     if report_url:
-        sections.append(f"**Meeting:** [{title}]({report_url})")
+        md(f"\n**Meeting:** [{title}]({report_url})")
     else:
-        sections.append(f"**Meeting:** {title}")
+        md(f"\n**Meeting:** {title}")
     
     # Data e hora do evento
     if start_time and end_time:
         try:
-            start_dt = datetime.fromisoformat(start_time.rstrip('Z'))
-            end_dt = datetime.fromisoformat(end_time.rstrip('Z'))
+            start_dt = datetime.fromisoformat(start_time)
+            end_dt = datetime.fromisoformat(end_time)
             start_local = start_dt.astimezone(TZ)
             end_local = end_dt.astimezone(TZ)
-            event_time = f"{start_local.strftime('%Y-%m-%d %I:%M %p')} - {end_local.strftime('%I:%M %p')} ({TZ.zone})"
-            sections.append(f"**Event time:** {event_time}")
+            event_time = f"{start_local.strftime('%Y-%m-%d %I:%M %p')} - {end_local.strftime('%I:%M %p')} ({TZ.key})"
+            md(f"\n**Event time:** {event_time}")
         except:
-            sections.append(f"**Event time:** {start_time} - {end_time}")
+            md(f"\n**Event time:** {start_time} - {end_time}")
     
     # Participantes
-    participants = data.get("participants", [])
-    if participants:
-        sections.append(f"**Participants:** {', '.join(p.get('name', '') for p in participants)}\n")
+    if ctx.participants_csv:
+        md(f"\n**Participants:** {ctx.participants_csv}\n")
     
     # Resumo
-    summary = data.get("summary", "")
-    if summary:
-        sections.append("## ✨ Summary\n")
-        sections.append(f"{summary}\n")
+    if ctx.summary:
+        md("\n## ✨ Summary\n")
+        md(f"\n{ctx.summary}\n")
     
     # Capítulos e Tópicos
-    chapter_summaries = data.get("chapter_summaries", [])
+    chapter_summaries = data.get("chapter_summaries") or ()
     if chapter_summaries:
-        sections.append("## 💬 Chapters & Topics\n")
+        md("\n## 💬 Chapters & Topics\n")
         for chapter in chapter_summaries:
             title = chapter.get("title", "")
             description = chapter.get("description", "")
-            chapter_topics = chapter.get("topics", [])
+            chapter_topics = chapter.get("topics") or ()
             
-            sections.append(f"**{title}** [{description}]")
+            md(f"\n**{title}** [{description}]")
             for topic in chapter_topics:
-                sections.append(f"- {topic.get('text', '')}")
-            sections.append("")
+                md(f"\n- {topic.get('text', '')}")
+            md("\n")
     
     # Action Items
-    action_items = data.get("action_items", [])
-    if action_items:
-        sections.append("## ✅ Action Items\n")
-        for item in action_items:
-            sections.append(f"- [ ] {item.get('text', '')}")
-        sections.append("")
+    if ctx.action_items:
+        md("\n## ✅ Action Items\n")
+        for item in ctx.action_items:
+            md(f"\n- [ ] {item}")
+        md("\n")
     
     # Key Questions
-    key_questions = data.get("key_questions", [])
+    key_questions = data.get("key_questions") or ()
     if key_questions:
-        sections.append("## 🔍 Key Questions\n")
+        md("\n## 🔍 Key Questions\n")
         for question in key_questions:
-            sections.append(f"- {question.get('text', '')}")
-        sections.append("")
+            md(f"\n- {question.get('text', '')}")
+        md("\n")
     
-    return "\n".join(sections)
+    return transcript_buf.getvalue(), markdown_buf.getvalue()
 
 async def analyze_objections(summary_text: str, transcript_text: str) -> str:
     """Analisa objeções usando GPT-4o e devolve o bloco para WhatsApp."""
@@ -454,10 +633,10 @@ Resumo da reunião:
 {summary_text}
 
 Transcrição:
-{transcript_text}"""
+{truncate_text(transcript_text, OPENAI_TRANSCRIPT_MAX_CHARS)}"""
 
     try:
-        response = openai.ChatCompletion.create(
+        response = await openai.ChatCompletion.acreate(
             model=OPENAI_MODEL,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2,